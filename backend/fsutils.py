@@ -0,0 +1,16 @@
+import os
+import tempfile
+
+def write_atomic(path: str, data: bytes) -> bool:
+    """Write via a temp file + os.replace so readers never see a partial file."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return True
+    except OSError as e:
+        print(f"⚠️ Could not write {path}:", e)
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return False
@@ -1,32 +1,59 @@
 import os
 import io
-import time
 import json
-from urllib.parse import quote
+import hashlib
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from urllib.parse import quote, urlencode
 import httpx
-import imageio
-from typing import Optional, List, Tuple
+import numpy as np
+from typing import AsyncIterator, Optional, List, Tuple
 
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
-from pydantic import BaseModel
-from sqlalchemy import text
+from cachetools import LRUCache, TTLCache
+from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageSequence
+from pydantic import BaseModel, ConfigDict, field_validator
+from sqlalchemy import func, inspect, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
 
 from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import RedirectResponse, Response
 
 from models import Base, engine, get_db, Slot, GuildConfig
+from fsutils import write_atomic
 
 # =============================================================================
 # App & CORS
 # =============================================================================
-app = FastAPI(title="Slot Manager Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _init_db()
+    # one pooled, keep-alive HTTP/2 client for all Discord calls
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        timeout=20.0,
+    )
+    try:
+        yield
+    finally:
+        await app.state.http.aclose()
+        RENDER_POOL.shutdown(cancel_futures=True)
+
+app = FastAPI(title="Slot Manager Backend", lifespan=lifespan)
 
 FRONTEND_URL = os.getenv("VITE_FRONTEND_URL") or os.getenv("FRONTEND_URL", "https://slotmanager-frontend.onrender.com")
 REDIRECT_URI = os.getenv("REDIRECT_URI", "https://slotmanager-backend.onrender.com/auth/callback")
 DISCORD_CLIENT_ID = os.getenv("DISCORD_CLIENT_ID", "")
 DISCORD_CLIENT_SECRET = os.getenv("DISCORD_CLIENT_SECRET", "")
 DISCORD_BOT_TOKEN = os.getenv("DISCORD_BOT_TOKEN", "")
+ADMINISTRATOR = 0x8  # Discord permission bit
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,6 +62,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# JSON (slot lists, channels, emojis) compresses well; GIF/PNG bodies are skipped
+app.add_middleware(GZipMiddleware, minimum_size=500)
 
 # =============================================================================
 # Files / Paths
@@ -44,118 +73,243 @@ ASSETS_DIR = os.path.join(BASE_DIR, "assets")
 GIFS_DIR = os.path.join(ASSETS_DIR, "gifs")
 os.makedirs(GIFS_DIR, exist_ok=True)
 DEFAULT_GIF_NAME = "default.gif"  # put one here: backend/assets/gifs/default.gif
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(BASE_DIR, "cache"))  # rebuildable, safe to delete
 
 # =============================================================================
 # DB bootstrap / safe migrations
 # =============================================================================
-print("Initializing database...")
-Base.metadata.create_all(bind=engine)
-
-def _ensure_columns():
-    with engine.begin() as conn:
-        for col in ("discord_message_id", "discord_channel_id"):
-            try:
-                conn.execute(text(f"ALTER TABLE slots ADD COLUMN {col} VARCHAR"))
-            except Exception:
-                pass
-
-_ensure_columns()
-print("Database ready.")
+MIGRATION_LOCK_KEY = 727182  # pg advisory lock: one worker migrates at a time
+
+def _ensure_columns(conn):
+    # columns added after the first deploy; one introspection, ALTER only what is missing
+    existing = {c["name"] for c in inspect(conn).get_columns("slots")}
+    missing = [c for c in ("discord_message_id", "discord_channel_id", "content_hash") if c not in existing]
+    for col in missing:
+        conn.execute(text(f"ALTER TABLE slots ADD COLUMN {col} VARCHAR"))
+    conn.commit()
+
+def _ensure_slot_unique_index(conn):
+    # tables created before the (guild_id, slot_number) index existed
+    if "uq_slots_guild_slot" not in {ix["name"] for ix in inspect(conn).get_indexes("slots")}:
+        # older, racy lazy-init could insert a slot twice. Which copy to keep is the
+        # operator's call, so refuse to start rather than delete slot data here.
+        dupes = conn.execute(text(
+            "SELECT guild_id, slot_number, COUNT(*) FROM slots "
+            "WHERE guild_id IS NOT NULL AND slot_number IS NOT NULL "
+            "GROUP BY guild_id, slot_number HAVING COUNT(*) > 1 "
+            "ORDER BY guild_id, slot_number"
+        )).all()
+        if dupes:
+            pairs = ", ".join(f"({g}, {n}) x{c}" for g, n, c in dupes)
+            raise RuntimeError(
+                "Duplicate (guild_id, slot_number) rows in slots; remove the extra rows "
+                f"so uq_slots_guild_slot can be created: {pairs}"
+            )
+        try:
+            conn.execute(text(
+                "CREATE UNIQUE INDEX uq_slots_guild_slot ON slots (guild_id, slot_number)"
+            ))
+        except Exception as e:
+            conn.rollback()
+            # slot writes all rely on ON CONFLICT (guild_id, slot_number)
+            raise RuntimeError(f"Could not create uq_slots_guild_slot: {e}") from e
+    # the composite index serves guild_id lookups too; these only slow writes
+    conn.execute(text("DROP INDEX IF EXISTS ix_slots_guild_id"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_slots_slot_number"))
+    conn.commit()
+
+def _migrate(conn):
+    Base.metadata.create_all(bind=conn)
+    conn.commit()
+    _ensure_columns(conn)
+    _ensure_slot_unique_index(conn)
+
+def _warm_pool():
+    # open (and ping) every pooled connection now rather than on the first requests
+    size = engine.pool.size() if isinstance(engine.pool, QueuePool) else 1
+    conns = []
+    try:
+        for _ in range(size):
+            conn = engine.connect()
+            conns.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in conns:
+            conn.close()
+
+def _init_db():
+    print("Initializing database...")
+    is_pg = engine.dialect.name == "postgresql"
+    with engine.connect() as conn:
+        if is_pg:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            conn.commit()
+        try:
+            _migrate(conn)
+        finally:
+            if is_pg:
+                conn.rollback()
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+                conn.commit()
+    _warm_pool()
+    print("Database ready.")
+
+# INSERT ... ON CONFLICT support for the configured backend
+if engine.dialect.name == "postgresql":
+    from sqlalchemy.dialects.postgresql import insert as _conflict_insert
+else:
+    from sqlalchemy.dialects.sqlite import insert as _conflict_insert
 
 # =============================================================================
 # Helpers
 # =============================================================================
-def _db():
-    return next(get_db())
+# Column defaults of a freshly created slot row (teamname="", font_size=48, ...)
+SLOT_DEFAULTS = {
+    c.name: c.default.arg
+    for c in Slot.__table__.columns
+    if c.default is not None and c.default.is_scalar
+}
 
 # --- Emoji image cache for speed --------------------------------------------
-EMOJI_IMG_CACHE: dict[str, Image.Image] = {}
+# Bounded so a long-lived worker does not keep every emoji/size it ever drew;
+# the lock is needed because slots render in worker threads.
+EMOJI_IMG_CACHE: LRUCache = LRUCache(maxsize=512)
+_EMOJI_CACHE_LOCK = threading.Lock()
+# Scaled emoji PNGs on disk, so a restart (or another render worker) skips the CDN
+EMOJI_CACHE_DIR = os.path.join(CACHE_DIR, "emoji")
+os.makedirs(EMOJI_CACHE_DIR, exist_ok=True)
+
+_emoji_http: Optional[httpx.Client] = None
+_emoji_http_pid: Optional[int] = None
+
+def _emoji_client() -> httpx.Client:
+    """Keep-alive client for the emoji CDN, one per process (render workers are forked)."""
+    global _emoji_http, _emoji_http_pid
+    if _emoji_http is None or _emoji_http_pid != os.getpid():
+        _emoji_http = httpx.Client(http2=True, timeout=10.0, limits=httpx.Limits(max_keepalive_connections=32))
+        _emoji_http_pid = os.getpid()
+    return _emoji_http
 
 def _fetch_emoji_image(url: str, target_px: int) -> Optional[Image.Image]:
     """Download and cache an emoji image (static or animated first frame) and scale to ~target_px height."""
     if not url or not url.startswith("http"):
         return None
     key = f"{url}@{target_px}"
-    if key in EMOJI_IMG_CACHE:
-        return EMOJI_IMG_CACHE[key]
+    with _EMOJI_CACHE_LOCK:
+        cached = EMOJI_IMG_CACHE.get(key)
+    if cached is not None:
+        return cached
+    disk_path = os.path.join(
+        EMOJI_CACHE_DIR, f"{hashlib.blake2b(url.encode(), digest_size=16).hexdigest()}@{target_px}.png"
+    )
     try:
-        r = httpx.get(url, timeout=10.0)
-        r.raise_for_status()
-        img = Image.open(io.BytesIO(r.content)).convert("RGBA")
-        # Scale height to target_px
-        ratio = target_px / max(1, img.height)
-        new_w = max(1, int(img.width * ratio))
-        new_h = max(1, int(img.height * ratio))
-        img = img.resize((new_w, new_h), Image.Resampling.LANCZOS)
-        EMOJI_IMG_CACHE[key] = img
+        if os.path.exists(disk_path):
+            img = Image.open(disk_path).convert("RGBA")
+        else:
+            r = _emoji_client().get(url)
+            r.raise_for_status()
+            img = Image.open(io.BytesIO(r.content)).convert("RGBA")
+            # Scale height to target_px
+            ratio = target_px / max(1, img.height)
+            new_w = max(1, int(img.width * ratio))
+            new_h = max(1, int(img.height * ratio))
+            img = img.resize((new_w, new_h), Image.Resampling.LANCZOS)
+            buf = io.BytesIO()
+            img.save(buf, format="PNG")
+            write_atomic(disk_path, buf.getvalue())
+        with _EMOJI_CACHE_LOCK:
+            EMOJI_IMG_CACHE[key] = img
         return img
     except Exception:
         return None
 
 def _iter_gif_frames(path: str):
-    reader = imageio.get_reader(path, format="GIF")
-    meta = reader.get_meta_data()
-    duration = (meta.get("duration", 80) or 80) / 1000.0
-    for frame in reader:
-        yield Image.fromarray(frame).convert("RGBA"), duration
-
+    # Pillow decodes (and applies disposal) in C; no NumPy round-trip per frame
+    with Image.open(path) as im:
+        for frame in ImageSequence.Iterator(im):
+            yield frame.convert("RGBA"), (frame.info.get("duration", 80) or 80) / 1000.0
+
+# Decoded backgrounds are shared by every slot rendered in this process (all 24
+# slots of a send use the same one). mtime is part of the key so a replaced file
+# is decoded afresh. Each entry holds W*H*4 bytes per frame, hence the small bound.
+GIF_FRAME_CACHE_SIZE = int(os.getenv("GIF_FRAME_CACHE_SIZE", 4))
+
+@lru_cache(maxsize=GIF_FRAME_CACHE_SIZE)
+def _load_gif_frames(path: str, mtime_ns: int) -> Tuple[Tuple[Image.Image, float], ...]:
+    """All (RGBA frame, duration_s) pairs of a GIF. Callers must not modify the frames."""
+    return tuple(_iter_gif_frames(path))
+
+@lru_cache(maxsize=16)
+def _load_bg_rgba(path: str, mtime_ns: int) -> Image.Image:
+    """Decoded static background, shared like the GIF frames. Callers must not modify it."""
+    with Image.open(path) as im:
+        return im.convert("RGBA")
+
+@lru_cache(maxsize=128)
+def _truetype(font_path: str, size: int) -> ImageFont.FreeTypeFont:
+    # FreeType face parsing is costly; fonts are reused across frames and slots
+    return ImageFont.truetype(font_path, size)
+
+@lru_cache(maxsize=128)
 def _load_font(font_family: Optional[str], size: int) -> ImageFont.FreeTypeFont:
     # Try given font family under ./fonts first, then system fallback
     font_path = os.path.join(BASE_DIR, "fonts", (font_family or "DejaVuSans.ttf"))
     try:
-        return ImageFont.truetype(font_path, size)
+        return _truetype(font_path, size)
     except Exception:
         try:
-            return ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", size)
+            return _truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", size)
         except Exception:
             return ImageFont.load_default()
 
+# How far the glow can reach past the text: 1px of dilation plus the tail of a
+# radius-1.5 Gaussian, with margin.
+GLOW_PAD = 12
+
 def _render_text_with_glow(
-    base_img: Image.Image,
+    overlay: Image.Image,
     text: str,
     font: ImageFont.FreeTypeFont,
     x: int,
     y: int,
     color_hex: str,
 ) -> None:
-    """Render crisp text with a soft glow onto base_img at (x, y)."""
-    # upscale canvas to improve glow quality
-    upscale = 2
-    large = base_img.resize((base_img.width * upscale, base_img.height * upscale), Image.Resampling.LANCZOS)
-    text_layer = Image.new("RGBA", large.size, (0, 0, 0, 0))
-    d = ImageDraw.Draw(text_layer)
-
-    # upscale font
-    try:
-        font_path = getattr(font, "path", None) or getattr(font, "font", None)
-        size = getattr(font, "size", 48)
-        ufont = ImageFont.truetype(font_path, size * upscale) if font_path else ImageFont.load_default()
-    except Exception:
-        ufont = ImageFont.load_default()
-
-    ux, uy = x * upscale, y * upscale
-    # soft glow
-    glow = Image.new("RGBA", large.size, (0, 0, 0, 0))
-    gd = ImageDraw.Draw(glow)
-    for dx in range(-3, 4):
-        for dy in range(-3, 4):
-            gd.text((ux + dx, uy + dy), text, font=ufont, fill=(0, 0, 0, 180))
-    glow = glow.filter(ImageFilter.GaussianBlur(radius=3))
-
-    # main text
-    d.text((ux, uy), text, font=ufont, fill=color_hex or "#FFFFFF")
-
-    combined = Image.alpha_composite(large, glow)
-    combined = Image.alpha_composite(combined, text_layer)
-    final = combined.resize(base_img.size, Image.Resampling.LANCZOS)
-    base_img.paste(final, (0, 0), final)
-
-def _measure(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.FreeTypeFont) -> Tuple[int, int]:
-    bbox = draw.textbbox((0, 0), text, font=font)
+    """Render crisp text with a soft glow onto the transparent overlay at (x, y)."""
+    # Only the text's bounding box (padded by the glow's reach) is drawn and
+    # blurred; the rest of the canvas would stay transparent anyway.
+    left, top, right, bottom = font.getbbox(text)
+    x0 = max(0, x + left - GLOW_PAD)
+    y0 = max(0, y + top - GLOW_PAD)
+    x1 = min(overlay.width, x + right + GLOW_PAD)
+    y1 = min(overlay.height, y + bottom + GLOW_PAD)
+    if x1 <= x0 or y1 <= y0:
+        return
+    box_size = (x1 - x0, y1 - y0)
+    origin = (x - x0, y - y0)
+
+    # soft glow: one rasterization dilated by a 3x3 max filter (a +-1px spread)
+    mask = Image.new("L", box_size, 0)
+    ImageDraw.Draw(mask).text(origin, text, font=font, fill=180)
+    mask = mask.filter(ImageFilter.MaxFilter(3)).filter(ImageFilter.GaussianBlur(radius=1.5))
+    glow = Image.new("RGBA", box_size, (0, 0, 0, 0))
+    glow.putalpha(mask)
+
+    # main text: coverage rasterized once into an L mask, then used as the alpha
+    # of a solid fill (one channel written by FreeType instead of four)
+    text_mask = Image.new("L", box_size, 0)
+    ImageDraw.Draw(text_mask).text(origin, text, font=font, fill=255)
+    text_layer = Image.new("RGBA", box_size, color_hex or "#FFFFFF")
+    text_layer.putalpha(text_mask)
+
+    overlay.alpha_composite(Image.alpha_composite(glow, text_layer), dest=(x0, y0))
+
+def _measure(text: str, font: ImageFont.FreeTypeFont) -> Tuple[int, int]:
+    # straight from the font: same box as ImageDraw.textbbox at (0, 0), no canvas needed
+    bbox = font.getbbox(text)
     return bbox[2] - bbox[0], bbox[3] - bbox[1]
 
-def _compose_slot_frame(
-    base_img: Image.Image,
+def _build_slot_overlay(
+    size: Tuple[int, int],
     slot_number: int,
     teamname: str,
     teamtag: str,
@@ -166,9 +320,13 @@ def _compose_slot_frame(
     padding_top: Optional[int],
     padding_bottom: Optional[int],
 ) -> Image.Image:
-    """Draw: left=slot number, center=team (name/tag), right=emoji (image if URL, else unicode)."""
-    img = base_img.copy()
-    W, H = img.size
+    """
+    Rasterize the slot onto a transparent RGBA layer of the given size:
+    left=slot number, center=team (name/tag), right=emoji (image if URL, else unicode).
+    The layer is identical for every frame, so it is built once per slot.
+    """
+    overlay = Image.new("RGBA", size, (0, 0, 0, 0))
+    W, H = size
 
     fsize = int(font_size or 64)
     font = _load_font(font_family, fsize)
@@ -188,20 +346,18 @@ def _compose_slot_frame(
 
     slot_text = f"{slot_number}:"
 
-    d = ImageDraw.Draw(img)
-    slot_w, slot_h = _measure(d, slot_text, font)
-    main_w, main_h = _measure(d, main_text, font)
+    main_w, main_h = _measure(main_text, font)
 
     # y center in band
     y_text = top + (usable_h - main_h) // 2
 
     # left slot number
     left_x = 24
-    _render_text_with_glow(img, slot_text, font, left_x, y_text, color)
+    _render_text_with_glow(overlay, slot_text, font, left_x, y_text, color)
 
     # center main text
     center_x = (W - main_w) // 2
-    _render_text_with_glow(img, main_text, font, center_x, y_text, color)
+    _render_text_with_glow(overlay, main_text, font, center_x, y_text, color)
 
     # right emoji
     # if emoji_value startswith http -> treat as CDN image; otherwise draw unicode
@@ -212,50 +368,287 @@ def _compose_slot_frame(
             if em is not None:
                 ex = W - em.width - 24
                 ey = top + (usable_h - em.height) // 2
-                img.paste(em, (ex, ey), em)
+                overlay.alpha_composite(em, (max(ex, 0), max(ey, 0)), (max(-ex, 0), max(-ey, 0)))
         else:
-            ew, eh = _measure(d, emoji_value, font)
+            ew, eh = _measure(emoji_value, font)
             ex = W - ew - 24
             ey = top + (usable_h - eh) // 2
-            _render_text_with_glow(img, emoji_value, font, ex, ey, color)
+            _render_text_with_glow(overlay, emoji_value, font, ex, ey, color)
 
-    return img
+    return overlay
 
-def _build_payload_json(filename: str):
-    return json.dumps({"attachments": [{"id": "0", "filename": filename}]})
+def _prepare_overlay(overlay: Image.Image) -> Tuple[Tuple[int, int, int, int], np.ndarray, np.ndarray]:
+    """
+    Reduce an RGBA overlay to its non-transparent box plus the (premultiplied rgb,
+    255 - alpha) terms over that box, for _blend_overlay.
+    """
+    box = overlay.getchannel("A").getbbox() or (0, 0, 0, 0)
+    ov = np.asarray(overlay.crop(box), dtype=np.uint32)
+    alpha = ov[..., 3:4]
+    return box, ov[..., :3] * alpha, 255 - alpha
+
+def _blend_overlay(frame: Image.Image, box: Tuple[int, int, int, int],
+                   premul: np.ndarray, inv_alpha: np.ndarray) -> Image.Image:
+    """Source-over blend of a prepared overlay onto an RGBA frame; only the overlay's box is touched."""
+    out = np.array(frame)
+    x0, y0, x1, y1 = box
+    if x1 > x0 and y1 > y0:
+        f = out[y0:y1, x0:x1].astype(np.uint32)
+        if f[..., 3].min() == 255:
+            # opaque frame (every GIF/JPEG background): the output stays opaque
+            out[y0:y1, x0:x1, :3] = (premul + f[..., :3] * inv_alpha + 127) // 255
+        else:
+            # straight-alpha source-over: un-premultiply by the output alpha
+            dst = f[..., 3:] * inv_alpha  # frame alpha left showing, x255
+            den = (255 - inv_alpha) * 255 + dst  # output alpha, x255
+            num = premul * 255 + f[..., :3] * dst
+            rgb = (num + den // 2) // np.maximum(den, 1)
+            # fully transparent result: leave the frame's (invisible) colour as is
+            out[y0:y1, x0:x1, :3] = np.where(den > 0, rgb, f[..., :3])
+            out[y0:y1, x0:x1, 3:] = (den + 127) // 255
+    return Image.fromarray(out)
+
+def _slot_render_fields(s: Slot) -> dict:
+    """Plain copy of the Slot fields used for rendering (safe to hand to worker threads)."""
+    return {
+        "slot_number": s.slot_number,
+        "teamname": (s.teamname or "FreeSlot").strip(),
+        "teamtag": (s.teamtag or "").strip(),
+        "emoji_value": s.emoji,
+        "font_family": s.font_family,
+        "font_size": s.font_size,
+        "font_color": s.font_color,
+        "padding_top": s.padding_top,
+        "padding_bottom": s.padding_bottom,
+    }
 
-def _discord_send_file(channel_id: str, filename: str, file_bytes: bytes, token: str):
-    headers = {"Authorization": f"Bot {token}"}
-    files = {
-        "files[0]": (filename, file_bytes,
-                     "image/gif" if filename.endswith(".gif") else "image/png"),
-        "payload_json": (None, _build_payload_json(filename), "application/json"),
+def _render_slot(bg_path: str, fields: dict) -> Tuple[str, bytes, str]:
+    """Render one slot over the background at bg_path. Returns (filename, bytes, media_type)."""
+    slot_number = fields["slot_number"]
+    if bg_path.lower().endswith(".gif"):
+        # Decoded frames come from the per-process cache; blended and palettized
+        # frames still flow to the encoder one at a time.
+        frames = iter(_load_gif_frames(bg_path, os.stat(bg_path).st_mtime_ns))
+        first_img, first_dur = next(frames)
+        layers = _prepare_overlay(_build_slot_overlay(first_img.size, **fields))
+
+        def palettized(frame_img: Image.Image, dur: float) -> Image.Image:
+            # Per-frame ADAPTIVE on RGBA is a fast-octree pass (~1 ms/frame). A palette
+            # shared from frame 0 measured barely faster but 50-100% larger GIFs,
+            # since nearest-colour mapping breaks up the flat runs LZW relies on.
+            pal = _blend_overlay(frame_img, *layers).convert("P", palette=Image.ADAPTIVE, dither=Image.Dither.NONE)
+            pal.info["duration"] = int(dur * 1000)  # picked up per frame by the GIF encoder
+            return pal
+
+        out = io.BytesIO()
+        palettized(first_img, first_dur).save(
+            out,
+            format="GIF",
+            save_all=True,
+            append_images=(palettized(f, d) for f, d in frames),
+            loop=0,
+            optimize=True,  # drops unused palette entries: ~3% smaller, lossless
+            disposal=2,
+        )
+        return f"slot_{slot_number}.gif", out.getvalue(), "image/gif"
+
+    base = _load_bg_rgba(bg_path, os.stat(bg_path).st_mtime_ns)
+    final = _blend_overlay(base, *_prepare_overlay(_build_slot_overlay(base.size, **fields)))
+    out = io.BytesIO()
+    final.save(out, format="PNG")
+    return f"slot_{slot_number}.png", out.getvalue(), "image/png"
+
+# Rendering is CPU-bound Python/PIL work; separate processes sidestep the GIL so
+# slots render on every core. Workers start lazily on first use.
+RENDER_POOL = ProcessPoolExecutor(max_workers=os.cpu_count())
+
+# --- Rendered image cache -----------------------------------------------------
+# Keyed by everything that affects the pixels, so edits/replaced backgrounds miss.
+RENDER_CACHE_BYTES = 64 * 1024 * 1024
+_render_cache: LRUCache = LRUCache(maxsize=RENDER_CACHE_BYTES, getsizeof=lambda r: len(r[1]))
+_render_cache_lock = threading.Lock()
+
+# Bump whenever rendering output changes, so the disk cache (which outlives the
+# process) and client ETags stop matching renders made by older code.
+RENDER_VERSION = 3
+
+def _render_key(bg_path: str, fields: dict) -> str:
+    st = os.stat(bg_path)
+    raw = repr((RENDER_VERSION, os.path.basename(bg_path), st.st_mtime_ns, st.st_size, sorted(fields.items())))
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+# Second tier on disk: survives restarts and is shared by every worker process.
+RENDER_CACHE_DIR = os.path.join(CACHE_DIR, "renders")
+RENDER_DISK_CACHE_BYTES = int(os.getenv("RENDER_DISK_CACHE_BYTES", 512 * 1024 * 1024))
+os.makedirs(RENDER_CACHE_DIR, exist_ok=True)
+
+def _render_disk_path(bg_path: str, key: str) -> str:
+    ext = "gif" if bg_path.lower().endswith(".gif") else "png"
+    return os.path.join(RENDER_CACHE_DIR, f"{key}.{ext}")
+
+def _render_disk_get(bg_path: str, fields: dict, key: str) -> Optional[Tuple[str, bytes, str]]:
+    path = _render_disk_path(bg_path, key)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)  # mtime doubles as last-use time for eviction
+    except OSError:
+        return None
+    ext = path.rsplit(".", 1)[1]
+    return f"slot_{fields['slot_number']}.{ext}", data, f"image/{ext}"
+
+def _render_disk_put(bg_path: str, key: str, data: bytes):
+    if write_atomic(_render_disk_path(bg_path, key), data):
+        _prune_render_dir()
+
+def _prune_render_dir():
+    """Drop least recently used renders until the directory fits RENDER_DISK_CACHE_BYTES."""
+    entries = []
+    for e in os.scandir(RENDER_CACHE_DIR):
+        if e.name.endswith(".tmp"):
+            continue
+        try:
+            st = e.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, e.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= RENDER_DISK_CACHE_BYTES:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+async def _render_slot_cached(bg_path: str, fields: dict, key: str) -> Tuple[str, bytes, str]:
+    """Memory LRU, then disk, then a fresh render in RENDER_POOL."""
+    with _render_cache_lock:
+        cached = _render_cache.get(key)
+    if cached is not None:
+        return cached
+    rendered = await asyncio.to_thread(_render_disk_get, bg_path, fields, key)
+    if rendered is None:
+        loop = asyncio.get_running_loop()
+        rendered = await loop.run_in_executor(RENDER_POOL, _render_slot, bg_path, fields)
+        await asyncio.to_thread(_render_disk_put, bg_path, key, rendered[1])
+    if len(rendered[1]) <= RENDER_CACHE_BYTES:
+        with _render_cache_lock:
+            _render_cache[key] = rendered
+    return rendered
+
+# Discord accepts up to 10 attachments per message, within one upload size cap
+# (10 MB unless the guild is boosted).
+DISCORD_MAX_FILES = 10
+DISCORD_MAX_UPLOAD_BYTES = int(os.getenv("DISCORD_MAX_UPLOAD_BYTES", 10 * 1024 * 1024))
+
+def _build_payload_json(filenames: List[str]):
+    return json.dumps({"attachments": [{"id": str(i), "filename": fn} for i, fn in enumerate(filenames)]})
+
+def _multipart_files(files: List[Tuple[str, bytes]]) -> dict:
+    form = {
+        f"files[{i}]": (filename, file_bytes,
+                        "image/gif" if filename.endswith(".gif") else "image/png")
+        for i, (filename, file_bytes) in enumerate(files)
     }
-    return httpx.post(
+    form["payload_json"] = (None, _build_payload_json([fn for fn, _ in files]), "application/json")
+    return form
+
+async def _batch_uploads(items: AsyncIterator[tuple]) -> AsyncIterator[list]:
+    """
+    Greedily split (slot, filename, bytes) items into message-sized batches, keeping
+    order. Each batch is yielded as soon as it is full, so it can be uploaded while
+    later items are still being produced.
+    """
+    batch, batch_bytes = [], 0
+    async for item in items:
+        size = len(item[2])
+        if batch and (len(batch) >= DISCORD_MAX_FILES or batch_bytes + size > DISCORD_MAX_UPLOAD_BYTES):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(item)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+async def _discord_send_files(client: httpx.AsyncClient, channel_id: str,
+                              files: List[Tuple[str, bytes]], token: str):
+    headers = {"Authorization": f"Bot {token}"}
+    return await client.post(
         f"https://discord.com/api/v10/channels/{channel_id}/messages",
         headers=headers,
-        files=files,
+        files=_multipart_files(files),
         timeout=60.0,
     )
 
-def _discord_edit_file(channel_id: str, message_id: str,
-                       filename: str, file_bytes: bytes, token: str):
+async def _discord_edit_files(client: httpx.AsyncClient, channel_id: str, message_id: str,
+                              files: List[Tuple[str, bytes]], token: str):
     headers = {"Authorization": f"Bot {token}"}
-    files = {
-        "files[0]": (filename, file_bytes,
-                     "image/gif" if filename.endswith(".gif") else "image/png"),
-        "payload_json": (None, _build_payload_json(filename), "application/json"),
-    }
-    return httpx.patch(
+    return await client.patch(
         f"https://discord.com/api/v10/channels/{channel_id}/messages/{message_id}",
         headers=headers,
-        files=files,
+        files=_multipart_files(files),
         timeout=60.0,
     )
 
+async def _discord_upload(send, ready_at: float = 0.0) -> Tuple[httpx.Response, float]:
+    """
+    Run one upload (a no-arg coroutine factory), sleeping out 429s for up to 3 tries.
+    Waits until ``ready_at`` (event-loop time) first, and returns the response with
+    the time the next upload may start: once the channel's rate-limit bucket reports
+    nothing remaining, that is when it resets. The wait is only paid if another
+    upload actually follows, and renders keep running meanwhile.
+    """
+    loop = asyncio.get_running_loop()
+    delay = ready_at - loop.time()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    for _ in range(3):
+        resp = await send()
+        if resp.status_code != 429:
+            break
+        retry_after = resp.json().get("retry_after", 1)
+        await asyncio.sleep(float(retry_after) + 0.3)
+    next_at = 0.0
+    if resp.headers.get("x-ratelimit-remaining") == "0":
+        next_at = loop.time() + float(resp.headers.get("x-ratelimit-reset-after", 1))
+    return resp, next_at
+
 # =============================================================================
 # Schemas
 # =============================================================================
+class SlotOut(BaseModel):
+    """A slot as the dashboard reads it, validated straight from the ORM row."""
+    model_config = ConfigDict(from_attributes=True)
+
+    slot_number: int
+    teamname: Optional[str] = None
+    teamtag: Optional[str] = None
+    emoji: Optional[str] = None          # unicode or CDN url
+    background_url: Optional[str] = None
+    is_gif: bool = False
+    font_family: Optional[str] = None
+    font_size: Optional[int] = None
+    font_color: Optional[str] = None
+    padding_top: Optional[int] = None
+    padding_bottom: Optional[int] = None
+
+    @field_validator("is_gif", mode="before")
+    @classmethod
+    def _is_gif_flag(cls, v):
+        # stored as a nullable 0/1 Integer column
+        return bool(v)
+
+# pydantic-core serializes these far faster than hand-built dicts + jsonable_encoder
+class BootstrapOut(BaseModel):
+    slots: List[SlotOut]
+    channel_id: Optional[str]
+    gifs: List[str]
+    emojis: List[dict]
+    channels: List[dict]
+    errors: List[str]  # optional parts ("emojis", "channels") Discord failed to return
+
 class SlotItem(BaseModel):
     slot_number: int
     teamname: Optional[str] = None
@@ -284,16 +677,14 @@ class GuildChannelBody(BaseModel):
 # ----------------------------------------------------------------------
 # Return available GIFs for the guild
 # ----------------------------------------------------------------------
+def _guild_gif_names() -> List[str]:
+    gifs_dir = os.path.join("assets", "gifs")
+    return [f for f in os.listdir(gifs_dir) if f.lower().endswith((".gif", ".mp4"))]
+
 @app.get("/api/guilds/{guild_id}/gifs")
 async def list_guild_gifs(guild_id: str):
-    gifs_dir = os.path.join("assets", "gifs")
     try:
-        files = [
-            f
-            for f in os.listdir(gifs_dir)
-            if f.lower().endswith((".gif", ".mp4"))
-        ]
-        return {"status": "success", "gifs": files}
+        return {"status": "success", "gifs": _guild_gif_names()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -301,19 +692,30 @@ async def list_guild_gifs(guild_id: str):
 # ----------------------------------------------------------------------
 # Return Discord channels for the guild
 # ----------------------------------------------------------------------
-@app.get("/api/guilds/{guild_id}/channels")
-async def get_guild_channels(guild_id: str):
+# Channel lists rarely change; a short TTL spares Discord round-trips and rate limit
+_channels_cache: TTLCache = TTLCache(maxsize=1024, ttl=45)
+
+async def _fetch_guild_channels(guild_id: str) -> list:
+    cached = _channels_cache.get(guild_id)
+    if cached is not None:
+        return cached
     try:
         url = f"https://discord.com/api/guilds/{guild_id}/channels"
         headers = {"Authorization": f"Bot {DISCORD_BOT_TOKEN}"}
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers)
+        response = await app.state.http.get(url, headers=headers)
         if response.status_code != 200:
             raise HTTPException(status_code=response.status_code, detail="Failed to fetch channels")
-        return response.json()
-    except Exception as e:
+        channels = response.json()
+        _channels_cache[guild_id] = channels
+        return channels
+    except httpx.HTTPError as e:
+        # Discord's own error statuses (403/404, ...) pass through as raised above
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/guilds/{guild_id}/channels")
+async def get_guild_channels(guild_id: str):
+    return await _fetch_guild_channels(guild_id)
+
 @app.get("/")
 def root():
     return {"ok": True, "service": "slotmanager-backend"}
@@ -326,32 +728,30 @@ def list_gifs():
     return {"gifs": files}
 
 # --- Guild Channels (for bot compatibility) ----------------------------------
-@app.get("/api/guilds/{guild_id}/channel")
-def get_guild_channel(guild_id: str):
-    db = _db()
+def _guild_channel_id(db: Session, guild_id: str) -> str:
     gc = db.query(GuildConfig).filter(GuildConfig.guild_id == guild_id).first()
-    return {"channel_id": gc.channel_id if gc else ""}
+    return gc.channel_id if gc else ""
+
+@app.get("/api/guilds/{guild_id}/channel")
+def get_guild_channel(guild_id: str, db: Session = Depends(get_db)):
+    return {"channel_id": _guild_channel_id(db, guild_id)}
 
 @app.post("/api/guilds/{guild_id}/channel")
-def set_guild_channel(guild_id: str, body: GuildChannelBody):
-    db = _db()
-    gc = db.query(GuildConfig).filter(GuildConfig.guild_id == guild_id).first()
-    if not gc:
-        gc = GuildConfig(guild_id=guild_id, channel_id=body.channel_id)
-        db.add(gc)
-    else:
-        gc.channel_id = body.channel_id
-        db.add(gc)
+def set_guild_channel(guild_id: str, body: GuildChannelBody, db: Session = Depends(get_db)):
+    db.execute(
+        _conflict_insert(GuildConfig)
+        .values(guild_id=guild_id, channel_id=body.channel_id)
+        .on_conflict_do_update(index_elements=["guild_id"], set_={"channel_id": body.channel_id})
+    )
     db.commit()
-    return {"ok": True, "channel_id": gc.channel_id}
+    return {"ok": True, "channel_id": body.channel_id}
 
 # --- Guild emojis (custom) ----------------------------------------------------
-@app.get("/api/guilds/{guild_id}/emojis")
-def list_guild_emojis(guild_id: str):
+async def _fetch_guild_emojis(guild_id: str) -> list:
     if not DISCORD_BOT_TOKEN:
         raise HTTPException(status_code=500, detail="DISCORD_BOT_TOKEN not configured")
     headers = {"Authorization": f"Bot {DISCORD_BOT_TOKEN}"}
-    r = httpx.get(f"https://discord.com/api/v10/guilds/{guild_id}/emojis", headers=headers, timeout=15.0)
+    r = await app.state.http.get(f"https://discord.com/api/v10/guilds/{guild_id}/emojis", headers=headers, timeout=15.0)
     if r.status_code != 200:
         raise HTTPException(status_code=r.status_code, detail=r.text)
     data = r.json()
@@ -362,12 +762,14 @@ def list_guild_emojis(guild_id: str):
         ext = "gif" if animated else "png"
         url = f"https://cdn.discordapp.com/emojis/{eid}.{ext}?quality=lossless"
         out.append({"id": eid, "name": e.get("name", ""), "animated": animated, "url": url})
-    return {"emojis": out}
+    return out
+
+@app.get("/api/guilds/{guild_id}/emojis")
+async def list_guild_emojis(guild_id: str):
+    return {"emojis": await _fetch_guild_emojis(guild_id)}
 
 # --- Slots list & lazy init ---------------------------------------------------
-@app.get("/api/guilds/{guild_id}/slots")
-def list_slots(guild_id: str):
-    db = _db()
+def _guild_slots(db: Session, guild_id: str) -> List[Slot]:
     slots = (
         db.query(Slot)
         .filter(Slot.guild_id == guild_id)
@@ -375,49 +777,62 @@ def list_slots(guild_id: str):
         .all()
     )
     if not slots:
-        for n in range(2, 26):
-            db.add(Slot(guild_id=guild_id, slot_number=n))
-        db.commit()
-        slots = (
-            db.query(Slot)
-            .filter(Slot.guild_id == guild_id)
-            .order_by(Slot.slot_number)
-            .all()
+        # one multi-row INSERT; ON CONFLICT keeps concurrent first loads from colliding
+        rows = [{"guild_id": guild_id, "slot_number": n} for n in range(2, 26)]
+        db.execute(
+            _conflict_insert(Slot)
+            .values(rows)
+            .on_conflict_do_nothing(index_elements=["guild_id", "slot_number"])
         )
-    return [
-        {
-            "slot_number": s.slot_number,
-            "teamname": s.teamname,
-            "teamtag": s.teamtag,
-            "emoji": s.emoji,  # unicode or CDN url
-            "background_url": s.background_url,
-            "is_gif": bool(s.is_gif),
-            "font_family": s.font_family,
-            "font_size": s.font_size,
-            "font_color": s.font_color,
-            "padding_top": s.padding_top,
-            "padding_bottom": s.padding_bottom,
-        }
-        for s in slots
-    ]
+        db.commit()
+        # nothing has been edited yet, so the rows hold only column defaults
+        slots = [Slot(**SLOT_DEFAULTS, **row) for row in rows]
+    return slots
 
-# --- Save one slot (kept for compatibility) ----------------------------------
-@app.post("/api/guilds/{guild_id}/slots/{slot_number}")
-def update_slot(guild_id: str, slot_number: int, data: dict):
-    db = _db()
-    s = db.query(Slot).filter(Slot.guild_id == guild_id, Slot.slot_number == slot_number).first()
-    if not s:
-        s = Slot(guild_id=guild_id, slot_number=slot_number)
-        db.add(s)
-    for k in ("teamname", "teamtag", "emoji", "font_family", "font_size", "font_color", "padding_top", "padding_bottom"):
-        if k in data and data[k] is not None:
-            setattr(s, k, data[k])
-    db.commit()
-    return {"status": "ok"}
+@app.get("/api/guilds/{guild_id}/slots", response_model=List[SlotOut])
+def list_slots(guild_id: str, db: Session = Depends(get_db)):
+    return _guild_slots(db, guild_id)
+
+# --- Dashboard bootstrap ------------------------------------------------------
+async def _optional_part(name: str, fetch, errors: List[str]) -> list:
+    """Await one Discord fetch for the bootstrap; a failure yields [] and is flagged."""
+    try:
+        return await fetch
+    except (HTTPException, httpx.HTTPError) as e:
+        print(f"⚠️ bootstrap: could not load {name}:", getattr(e, "detail", e))
+        errors.append(name)
+        return []
+
+@app.get("/api/guilds/{guild_id}/bootstrap", response_model=BootstrapOut)
+async def bootstrap_guild(guild_id: str, db: Session = Depends(get_db)):
+    """
+    Everything the dashboard loads for a guild in one request. The DB reads share
+    one session so they run together in a worker thread; the Discord fetches
+    overlap with them. Emojis and channels are optional: if Discord refuses one,
+    it comes back empty and is named in "errors" instead of failing the request.
+    """
+    def _local_reads():
+        return _guild_slots(db, guild_id), _guild_channel_id(db, guild_id), _guild_gif_names()
+
+    errors: List[str] = []
+    (slots, channel_id, gifs), emojis, channels = await asyncio.gather(
+        run_in_threadpool(_local_reads),
+        _optional_part("emojis", _fetch_guild_emojis(guild_id), errors),
+        _optional_part("channels", _fetch_guild_channels(guild_id), errors),
+    )
+    return {
+        "slots": slots,
+        "channel_id": channel_id,
+        "gifs": gifs,
+        "emojis": emojis,
+        "channels": channels,
+        "errors": sorted(errors),
+    }
 
 # --- Save ALL slots at once (one-button save) --------------------------------
+# Registered before /slots/{slot_number}, which would otherwise match "bulk_update"
 @app.post("/api/guilds/{guild_id}/slots/bulk_update")
-async def bulk_update_slots(guild_id: str, request: Request):
+async def bulk_update_slots(guild_id: str, request: Request, db: Session = Depends(get_db)):
     """
     Save/update all provided slots in a single transaction.
     Hardened parsing to avoid 422s:
@@ -453,8 +868,8 @@ async def bulk_update_slots(guild_id: str, request: Request):
                     return f"https://cdn.discordapp.com/emojis/{eid}.{ext}?quality=lossless"
             return val
 
-        db = _db()
         updated = 0
+        rows = {}  # slot_number -> row; a repeated slot keeps its last entry
 
         for item in payload_slots:
             if not isinstance(item, dict):
@@ -468,11 +883,6 @@ async def bulk_update_slots(guild_id: str, request: Request):
                 # skip invalid slot entries rather than 422
                 continue
 
-            s = db.query(Slot).filter(Slot.guild_id == guild_id, Slot.slot_number == sn).first()
-            if not s:
-                s = Slot(guild_id=guild_id, slot_number=sn)
-                db.add(s)
-
             # Normalize fields
             teamname = item.get("teamname")
             teamtag = item.get("teamtag")
@@ -488,19 +898,32 @@ async def bulk_update_slots(guild_id: str, request: Request):
             background_url = item.get("background_url")
             bg_value = background_name or background_url or DEFAULT_GIF_NAME
 
-            # Apply to model
-            s.teamname = teamname
-            s.teamtag = teamtag
-            s.emoji = emoji
-            s.font_family = font_family
-            s.font_size = font_size
-            s.font_color = font_color
-            s.padding_top = padding_top
-            s.padding_bottom = padding_bottom
-            s.background_url = bg_value
+            rows[sn] = {
+                "guild_id": guild_id,
+                "slot_number": sn,
+                "teamname": teamname,
+                "teamtag": teamtag,
+                "emoji": emoji,
+                "font_family": font_family,
+                "font_size": font_size,
+                "font_color": font_color,
+                "padding_top": padding_top,
+                "padding_bottom": padding_bottom,
+                "background_url": bg_value,
+            }
 
             updated += 1
 
+        if rows:
+            # one multi-row upsert instead of a SELECT (+ INSERT/UPDATE) per slot
+            stmt = _conflict_insert(Slot).values(list(rows.values()))
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=["guild_id", "slot_number"],
+                set_={
+                    **{k: stmt.excluded[k] for k in next(iter(rows.values())) if k not in ("guild_id", "slot_number")},
+                    "last_updated": func.now(),
+                },
+            ))
         db.commit()
         return {"ok": True, "updated": updated}
 
@@ -512,68 +935,71 @@ async def bulk_update_slots(guild_id: str, request: Request):
         # Never 422 on normalization issues—return helpful message
         raise HTTPException(status_code=400, detail=f"Invalid payload: {e}")
 
+# --- Save one slot (kept for compatibility) ----------------------------------
+@app.post("/api/guilds/{guild_id}/slots/{slot_number}")
+def update_slot(guild_id: str, slot_number: int, data: dict, db: Session = Depends(get_db)):
+    fields = {
+        k: data[k]
+        for k in ("teamname", "teamtag", "emoji", "font_family", "font_size", "font_color", "padding_top", "padding_bottom")
+        if k in data and data[k] is not None
+    }
+    # single round-trip upsert; last_updated is set by hand since onupdate does not fire here
+    db.execute(
+        _conflict_insert(Slot)
+        .values(guild_id=guild_id, slot_number=slot_number, **fields)
+        .on_conflict_do_update(
+            index_elements=["guild_id", "slot_number"],
+            set_={**fields, "last_updated": func.now()},
+        )
+    )
+    db.commit()
+    return {"status": "ok"}
+
 # --- Single image generation (for bot) ---------------------------------------
 @app.get("/api/generate/{guild_id}/{slot_number}")
-def generate_single(guild_id: str, slot_number: int, gif_name: Optional[str] = None):
+async def generate_single(guild_id: str, slot_number: int, request: Request,
+                          gif_name: Optional[str] = None, db: Session = Depends(get_db)):
     """
     Generate and return a single slot image as GIF/PNG (bytes).
     Chooses a background from assets/gifs: gif_name or DEFAULT_GIF_NAME.
     Uses per-slot settings, including emoji (unicode or CDN url).
+    Responses carry a content-derived ETag; a matching If-None-Match gets 304.
     """
     gif_file = gif_name or DEFAULT_GIF_NAME
     bg_path = os.path.join(GIFS_DIR, gif_file)
     if not os.path.isfile(bg_path):
         raise HTTPException(status_code=404, detail=f"Background not found: {gif_file}")
 
-    db = _db()
-    s = db.query(Slot).filter(Slot.guild_id == guild_id, Slot.slot_number == slot_number).first()
-    if not s:
+    def _load_fields() -> Optional[dict]:
+        s = db.query(Slot).filter(Slot.guild_id == guild_id, Slot.slot_number == slot_number).first()
+        return _slot_render_fields(s) if s else None
+
+    # sync DB round trip: keep it off the event loop (the bot calls this route concurrently)
+    fields = await run_in_threadpool(_load_fields)
+    if fields is None:
         raise HTTPException(status_code=404, detail="Slot not found")
 
-    team = (s.teamname or "FreeSlot").strip()
-    tag = (s.teamtag or "").strip()
-    text = f"{team} {tag}".strip()
+    key = _render_key(bg_path, fields)
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (t.strip() for t in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
 
-    is_gif = bg_path.lower().endswith(".gif")
+    # CPU-bound PIL work runs in the render pool, keeping the event loop free
+    _, content, media_type = await _render_slot_cached(bg_path, fields, key)
+    return Response(content=content, media_type=media_type, headers=headers)
 
-    if is_gif:
-        frames, durations = [], []
-        for frame_img, dur in _iter_gif_frames(bg_path):
-            frm = _compose_slot_frame(
-                frame_img, s.slot_number, team, tag, s.emoji,
-                s.font_family, s.font_size, s.font_color, s.padding_top, s.padding_bottom
-            )
-            frames.append(frm)
-            durations.append(dur)
+# --- Send or update all slots to a Discord channel ---------------------------
+RENDER_CONCURRENCY = 8  # slots queued for rendering at once
 
-        out = io.BytesIO()
-        pal = [f.convert("P", palette=Image.ADAPTIVE, dither=Image.Dither.NONE) for f in frames]
-        pal[0].save(
-            out,
-            format="GIF",
-            save_all=True,
-            append_images=pal[1:],
-            duration=[int(d * 1000) for d in durations],
-            loop=0,
-            optimize=False,
-            disposal=2,
-        )
-        out.seek(0)
-        return Response(content=out.getvalue(), media_type="image/gif")
-    else:
-        base = Image.open(bg_path).convert("RGBA")
-        final = _compose_slot_frame(
-            base, s.slot_number, team, tag, s.emoji,
-            s.font_family, s.font_size, s.font_color, s.padding_top, s.padding_bottom
-        )
-        out = io.BytesIO()
-        final.save(out, format="PNG")
-        out.seek(0)
-        return Response(content=out.getvalue(), media_type="image/png")
+async def _process_slot(bg_path: str, fields: dict, sem: asyncio.Semaphore) -> Tuple[str, bytes, str]:
+    """Render one slot (or reuse a cached render), bounded by sem."""
+    async with sem:
+        return await _render_slot_cached(bg_path, fields, _render_key(bg_path, fields))
 
-# --- Send or update all slots to a Discord channel ---------------------------
 @app.post("/api/guilds/{guild_id}/send_slots")
-def send_slots(guild_id: str, body: SendSlotsBody):
+async def send_slots(guild_id: str, body: SendSlotsBody, db: Session = Depends(get_db)):
     if not DISCORD_BOT_TOKEN:
         raise HTTPException(status_code=500, detail="DISCORD_BOT_TOKEN not configured")
 
@@ -583,9 +1009,11 @@ def send_slots(guild_id: str, body: SendSlotsBody):
     if not os.path.isfile(bg_path):
         raise HTTPException(status_code=404, detail=f"Background not found: {chosen_bg}")
 
-    db = _db()
-    slots = (
-        db.query(Slot)
+    # Sync DB work runs in the threadpool, off the event loop. Committed slots keep
+    # their loaded values, so reading them afterwards doesn't re-query on the loop.
+    db.expire_on_commit = False
+    slots = await run_in_threadpool(
+        lambda: db.query(Slot)
         .filter(Slot.guild_id == guild_id)
         .order_by(Slot.slot_number)
         .all()
@@ -593,79 +1021,107 @@ def send_slots(guild_id: str, body: SendSlotsBody):
     if not slots:
         raise HTTPException(status_code=404, detail="No slots found for this guild")
 
-    is_gif = bg_path.lower().endswith(".gif")
+    # A posted message whose slots all still hash to what it shows needs neither
+    # a render nor an upload. An edit replaces every attachment of a message, so
+    # one changed slot means re-sending its whole message.
+    def is_posted(s: Slot) -> bool:
+        return bool(s.discord_message_id) and s.discord_channel_id == channel_id
+
+    fields = {s.slot_number: _slot_render_fields(s) for s in slots}
+    keys = {n: _render_key(bg_path, f) for n, f in fields.items()}
+    stale_messages = {
+        s.discord_message_id for s in slots
+        if is_posted(s) and s.content_hash != keys[s.slot_number]
+    }
+    unchanged = [s.slot_number for s in slots if is_posted(s) and s.discord_message_id not in stale_messages]
+    slots = [s for s in slots if not is_posted(s) or s.discord_message_id in stale_messages]
+
+    # Every render starts now; each message is uploaded as soon as its own slots
+    # are done, so uploads overlap the renders still running. Uploads stay in slot
+    # order so new messages appear in the channel as 2, 3, 4, ...
+    sem = asyncio.Semaphore(RENDER_CONCURRENCY)
+    renders = {
+        s.slot_number: asyncio.ensure_future(_process_slot(bg_path, fields[s.slot_number], sem))
+        for s in slots
+    }
+    failed = []
 
+    async def rendered(s: Slot) -> Optional[Tuple[Slot, str, bytes]]:
+        try:
+            filename, file_bytes, _ = await renders[s.slot_number]
+        except Exception as e:
+            print(f"⚠️ Failed to render slot {s.slot_number}:", e)
+            failed.append(s.slot_number)
+            return None
+        return s, filename, file_bytes
+
+    async def rendered_new():
+        for s in slots:
+            if not is_posted(s):
+                item = await rendered(s)
+                if item is not None:
+                    yield item
+
+    # Slots already posted in this channel are edited in place, grouped by the
+    # message that holds them; the rest go out as new multi-attachment messages.
+    edits: dict[str, list] = {}
     for s in slots:
-        team = (s.teamname or "FreeSlot").strip()
-        tag = (s.teamtag or "").strip()
-
-        if is_gif:
-            frames, durations = [], []
-            for frame_img, dur in _iter_gif_frames(bg_path):
-                frm = _compose_slot_frame(
-                    frame_img, s.slot_number, team, tag, s.emoji,
-                    s.font_family, s.font_size, s.font_color, s.padding_top, s.padding_bottom
-                )
-                frames.append(frm)
-                durations.append(dur)
-
-            out = io.BytesIO()
-            pal = [f.convert("P", palette=Image.ADAPTIVE, dither=Image.Dither.NONE) for f in frames]
-            pal[0].save(
-                out,
-                format="GIF",
-                save_all=True,
-                append_images=pal[1:],
-                duration=[int(d * 1000) for d in durations],
-                loop=0,
-                optimize=False,
-                disposal=2,
+        if is_posted(s):
+            edits.setdefault(s.discord_message_id, []).append(s)
+
+    client = app.state.http
+    ready_at = 0.0  # loop time the channel's rate-limit bucket allows the next upload
+    try:
+        for message_id, group_slots in edits.items():
+            group = [await rendered(s) for s in group_slots]
+            if None in group:
+                # editing would drop the attachment of the slot that failed to render
+                failed.extend(item[0].slot_number for item in group if item is not None)
+                continue
+            files = [(fn, data) for _, fn, data in group]
+            resp, ready_at = await _discord_upload(
+                lambda: _discord_edit_files(client, channel_id, message_id, files, DISCORD_BOT_TOKEN),
+                ready_at,
             )
-            out.seek(0)
-            filename, file_bytes = f"slot_{s.slot_number}.gif", out.getvalue()
-        else:
-            base = Image.open(bg_path).convert("RGBA")
-            final = _compose_slot_frame(
-                base, s.slot_number, team, tag, s.emoji,
-                s.font_family, s.font_size, s.font_color, s.padding_top, s.padding_bottom
+            if resp.is_success:
+                for s, _, _ in group:
+                    s.content_hash = keys[s.slot_number]
+                await run_in_threadpool(db.commit)
+            else:
+                failed.extend(s.slot_number for s, _, _ in group)
+
+        async for batch in _batch_uploads(rendered_new()):
+            files = [(fn, data) for _, fn, data in batch]
+            resp, ready_at = await _discord_upload(
+                lambda: _discord_send_files(client, channel_id, files, DISCORD_BOT_TOKEN),
+                ready_at,
             )
-            out = io.BytesIO()
-            final.save(out, format="PNG")
-            out.seek(0)
-            filename, file_bytes = f"slot_{s.slot_number}.png", out.getvalue()
-
-        # send new or edit
-        if s.discord_message_id and s.discord_channel_id == channel_id:
-            resp = _discord_edit_file(channel_id, s.discord_message_id, filename, file_bytes, DISCORD_BOT_TOKEN)
-        else:
-            resp = _discord_send_file(channel_id, filename, file_bytes, DISCORD_BOT_TOKEN)
             if resp.is_success:
-                data = resp.json()
-                s.discord_message_id = data.get("id")
-                s.discord_channel_id = channel_id
-                db.add(s)
-                db.commit()
-
-        if resp.status_code == 429:
-            retry_after = resp.json().get("retry_after", 1)
-            time.sleep(float(retry_after) + 0.3)
-            continue
-
-        time.sleep(0.4)  # polite pacing
-
-    return {"status": "sent"}
+                message_id = resp.json().get("id")
+                for s, _, _ in batch:
+                    s.discord_message_id = message_id
+                    s.discord_channel_id = channel_id
+                    s.content_hash = keys[s.slot_number]
+                await run_in_threadpool(db.commit)
+            else:
+                failed.extend(s.slot_number for s, _, _ in batch)
+    finally:
+        # an upload error leaves later renders unawaited; don't leak them
+        for task in renders.values():
+            task.cancel()
+
+    failed.sort()
+    return {"status": "sent", "failed": failed, "unchanged": unchanged}
 
 # =============================================================================
 # OAuth callback – redirects to your frontend dashboard (SAFE ENCODING)
 # =============================================================================
 @app.get("/auth/callback")
-def auth_callback(code: str):
+async def auth_callback(code: str):
     """
     Handles Discord OAuth callback, fetches user info + guilds,
     and redirects to the frontend dashboard with guild_id, user_id, username.
     """
-    import httpx
-
     token_url = "https://discord.com/api/oauth2/token"
     data = {
         "client_id": DISCORD_CLIENT_ID,
@@ -676,7 +1132,7 @@ def auth_callback(code: str):
     }
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
 
-    token_response = httpx.post(token_url, data=data, headers=headers)
+    token_response = await app.state.http.post(token_url, data=data, headers=headers)
     if token_response.status_code != 200:
         print("Token error:", token_response.text)
         raise HTTPException(status_code=400, detail="Failed to get access token")
@@ -685,26 +1141,29 @@ def auth_callback(code: str):
     if not access_token:
         raise HTTPException(status_code=400, detail="Missing access token")
 
-    # 1️⃣ Get user info
-    user_data = httpx.get(
-        "https://discord.com/api/users/@me",
-        headers={"Authorization": f"Bearer {access_token}"}
-    ).json()
+    # 1️⃣ + 2️⃣ Get user info and the user's guilds (independent, so fetched together)
+    auth_headers = {"Authorization": f"Bearer {access_token}"}
+    user_resp, guilds_resp = await asyncio.gather(
+        app.state.http.get("https://discord.com/api/users/@me", headers=auth_headers),
+        app.state.http.get("https://discord.com/api/users/@me/guilds", headers=auth_headers),
+    )
+    user_data = user_resp.json()
 
     user_id = user_data.get("id")
     username = user_data.get("username")
 
-    # 2️⃣ Get user's guilds
-    guilds_resp = httpx.get(
-        "https://discord.com/api/users/@me/guilds",
-        headers={"Authorization": f"Bearer {access_token}"}
-    )
-
     if guilds_resp.status_code != 200:
         print("Guilds error:", guilds_resp.text)
         raise HTTPException(status_code=400, detail="Failed to fetch guilds")
 
-    guilds = guilds_resp.json()
+    # Only guilds the user owns or administers (behaviour change: the first guild in
+    # the list used to be picked regardless). Discord sends permissions as a
+    # decimal string.
+    guilds = [
+        g for g in guilds_resp.json()
+        if g.get("owner")
+        or (str(g.get("permissions", "0")).isdigit() and int(g["permissions"]) & ADMINISTRATOR)
+    ]
     if not guilds:
         raise HTTPException(status_code=400, detail="No accessible guilds found")
 
@@ -712,21 +1171,12 @@ def auth_callback(code: str):
     guild_id = guilds[0]["id"]
 
     # 3️⃣ Redirect user to dashboard with data
-    redirect_url = f"{FRONTEND_URL}/dashboard?guild_id={guild_id}&user_id={user_id}&username={username}"
+    query = urlencode({"guild_id": guild_id, "user_id": user_id, "username": username})
+    redirect_url = f"{FRONTEND_URL}/dashboard?{query}"
     print(f"✅ Redirecting user to: {redirect_url}")
 
     return RedirectResponse(url=redirect_url)
 
-from fastapi.responses import RedirectResponse
-
-DISCORD_CLIENT_ID = os.getenv("DISCORD_CLIENT_ID")
-REDIRECT_URI = os.getenv(
-    "REDIRECT_URI", "https://slotmanager-backend.onrender.com/auth/callback"
-)
-FRONTEND_URL = os.getenv(
-    "FRONTEND_URL", "https://slotmanager-frontend.onrender.com"
-)
-
 @app.get("/login")
 def discord_login():
     """
@@ -735,11 +1185,11 @@ def discord_login():
     if not DISCORD_CLIENT_ID:
         raise HTTPException(status_code=500, detail="DISCORD_CLIENT_ID not configured")
 
-    params = (
-        f"client_id={DISCORD_CLIENT_ID}"
-        f"&redirect_uri={REDIRECT_URI}"
-        f"&response_type=code"
-        f"&scope=identify%20guilds"
-    )
+    params = urlencode({
+        "client_id": DISCORD_CLIENT_ID,
+        "redirect_uri": REDIRECT_URI,
+        "response_type": "code",
+        "scope": "identify guilds",
+    }, quote_via=quote)
 
     return RedirectResponse(url=f"https://discord.com/api/oauth2/authorize?{params}")
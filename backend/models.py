@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, DateTime
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Index
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.sql import func
 
@@ -22,8 +22,8 @@ class Slot(Base):
     __tablename__ = "slots"
 
     id = Column(Integer, primary_key=True, index=True)
-    guild_id = Column(String, index=True)
-    slot_number = Column(Integer, index=True)
+    guild_id = Column(String)
+    slot_number = Column(Integer)
     teamname = Column(String, default="")
     teamtag = Column(String, default="")
     emoji = Column(String, default="")         # text form (<:name:id> or unicode)
@@ -38,9 +38,15 @@ class Slot(Base):
 
     discord_message_id = Column(String, nullable=True)
     discord_channel_id = Column(String, nullable=True)
+    content_hash = Column(String, nullable=True)  # render key of what the posted message shows
 
     last_updated = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        # one row per (guild, slot); lets inserts use ON CONFLICT
+        Index("uq_slots_guild_slot", "guild_id", "slot_number", unique=True),
+    )
+
 # ------------------------------------------------------------
 # Guild Config
 # ------------------------------------------------------------
@@ -60,9 +66,3 @@ def get_db():
         yield db
     finally:
         db.close()
-
-# ------------------------------------------------------------
-# Initialize tables
-# ------------------------------------------------------------
-Base.metadata.create_all(bind=engine)
-print("✅ Database tables created or verified.")
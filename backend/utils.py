@@ -1,13 +1,29 @@
 import os
 import io
+import hashlib
+from functools import lru_cache
+from cachetools import LRUCache
 from PIL import Image, ImageDraw, ImageFont, ImageSequence
 import requests
 from typing import Tuple
 
-# Cache emoji bitmaps for speed
-_EMOJI_CACHE = {}
+from fsutils import write_atomic
 
+# One keep-alive session for the emoji CDN and background downloads, instead of
+# a new TCP+TLS handshake per requests.get
+REQUESTS_SESSION = requests.Session()
+
+# Cache emoji bitmaps for speed: bounded in memory, and scaled PNGs on disk
+# (same layout as the backend's emoji cache) so restarts skip the CDN
+_EMOJI_CACHE = LRUCache(maxsize=512)
+EMOJI_CACHE_DIR = os.path.join(
+    os.getenv("CACHE_DIR", os.path.join(os.path.dirname(__file__), "cache")), "emoji"
+)
+os.makedirs(EMOJI_CACHE_DIR, exist_ok=True)
+
+@lru_cache(maxsize=64)
 def load_font(font_family: str, font_size: int):
+    # FreeType face parsing is costly; the same face/size is reused across slots
     try:
         return ImageFont.truetype(font_family, font_size)
     except Exception:
@@ -40,24 +56,42 @@ def fetch_emoji_bitmap(emoji_value: str, target_height: int = 64) -> Image.Image
         # Standard Unicode emoji — draw as text
         return None
 
-    if url in _EMOJI_CACHE:
-        return _EMOJI_CACHE[url]
+    key = (url, target_height)
+    if key in _EMOJI_CACHE:
+        return _EMOJI_CACHE[key]
 
+    cache_path = os.path.join(
+        EMOJI_CACHE_DIR, f"{hashlib.blake2b(url.encode(), digest_size=16).hexdigest()}@{target_height}.png"
+    )
     try:
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        img = Image.open(io.BytesIO(r.content)).convert("RGBA")
-        ratio = target_height / img.height
-        img = img.resize((int(img.width * ratio), target_height), Image.Resampling.LANCZOS)
-        _EMOJI_CACHE[url] = img
+        if os.path.isfile(cache_path):
+            img = Image.open(cache_path).convert("RGBA")
+        else:
+            r = REQUESTS_SESSION.get(url, timeout=10)
+            r.raise_for_status()
+            img = Image.open(io.BytesIO(r.content)).convert("RGBA")
+            ratio = target_height / img.height
+            img = img.resize((int(img.width * ratio), target_height), Image.Resampling.LANCZOS)
+            buf = io.BytesIO()
+            img.save(buf, format="PNG")
+            write_atomic(cache_path, buf.getvalue())
+        _EMOJI_CACHE[key] = img
         return img
     except Exception as e:
         print("⚠️ Failed to fetch emoji:", e)
         return None
 
-def draw_slot_on_image(pil_img: Image.Image, meta: dict) -> Image.Image:
-    draw = ImageDraw.Draw(pil_img)
-    w, h = pil_img.size
+def _text_size(text: str, font) -> Tuple[int, int]:
+    # replaces ImageDraw.textsize (removed in Pillow 10); needs no canvas
+    left, top, right, bottom = font.getbbox(text)
+    return right - left, bottom - top
+
+def layout_slot(size: Tuple[int, int], meta: dict) -> dict:
+    """
+    Measure everything draw_slot_on_image needs for an image of the given size.
+    Text and emoji are the same on every frame of a GIF, so this runs once per image.
+    """
+    w, h = size
 
     font_size = int(meta.get("font_size", 48))
     font = load_font(meta.get("font_family", "DejaVuSans.ttf"), font_size)
@@ -77,39 +111,50 @@ def draw_slot_on_image(pil_img: Image.Image, meta: dict) -> Image.Image:
     emoji_value = meta.get("emoji", "")
 
     # Measure text
-    slot_w, slot_h = draw.textsize(slot_text, font=font)
-    main_w, main_h = draw.textsize(main_text, font=font)
+    main_w, main_h = _text_size(main_text, font)
     y_center = usable_top + (usable_height - main_h) / 2
 
     padding_x = 20
-    left_x = padding_x
-    center_x = (w - main_w) / 2
-
-    # Draw left (slot number)
-    draw.text((left_x, y_center), slot_text, font=font, fill=color)
-
-    # Draw center (team name/tag)
-    draw.text((center_x, y_center), main_text, font=font, fill=color)
-
-    # Draw right (emoji)
+    layout = {
+        "font": font,
+        "color": color,
+        "texts": [
+            ((padding_x, y_center), slot_text),            # left (slot number)
+            (((w - main_w) / 2, y_center), main_text),     # center (team name/tag)
+        ],
+        "emoji_img": None,
+        "emoji_pos": None,
+    }
+
+    # Right (emoji)
     emoji_x = w - padding_x
     emoji_img = fetch_emoji_bitmap(emoji_value, target_height=font_size)
-
     if emoji_img:
         emoji_x -= emoji_img.width
         emoji_y = usable_top + (usable_height - emoji_img.height) / 2
-        pil_img.paste(emoji_img, (int(emoji_x), int(emoji_y)), emoji_img)
+        layout["emoji_img"] = emoji_img
+        layout["emoji_pos"] = (int(emoji_x), int(emoji_y))
     elif emoji_value:
         # fallback: draw as Unicode
-        emoji_w, emoji_h = draw.textsize(emoji_value, font=font)
-        emoji_x -= emoji_w
-        emoji_y = y_center
-        draw.text((emoji_x, emoji_y), emoji_value, font=font, fill=color)
+        emoji_w, _ = _text_size(emoji_value, font)
+        layout["texts"].append(((emoji_x - emoji_w, y_center), emoji_value))
 
+    return layout
+
+def draw_slot_layout(pil_img: Image.Image, layout: dict) -> Image.Image:
+    """Draw a precomputed layout_slot() onto pil_img (in place)."""
+    draw = ImageDraw.Draw(pil_img)
+    for xy, text in layout["texts"]:
+        draw.text(xy, text, font=layout["font"], fill=layout["color"])
+    if layout["emoji_img"] is not None:
+        pil_img.paste(layout["emoji_img"], layout["emoji_pos"], layout["emoji_img"])
     return pil_img
 
+def draw_slot_on_image(pil_img: Image.Image, meta: dict) -> Image.Image:
+    return draw_slot_layout(pil_img, layout_slot(pil_img.size, meta))
+
 def fetch_image_bytes(url: str) -> Tuple[bytes, str]:
-    r = requests.get(url, stream=True, timeout=20)
+    r = REQUESTS_SESSION.get(url, stream=True, timeout=20)
     r.raise_for_status()
     content_type = r.headers.get("content-type", "application/octet-stream")
     return r.content, content_type
@@ -121,10 +166,10 @@ def generate_from_url_bytes(bg_bytes: bytes, content_type: str, meta: dict) -> T
             im = Image.open(buf)
             frames = []
             duration = im.info.get("duration", 100)
+            layout = layout_slot(im.size, meta)
             for frame in ImageSequence.Iterator(im):
-                frame = frame.convert("RGBA")
-                composed = draw_slot_on_image(frame.copy(), meta)
-                frames.append(composed)
+                # convert() already returns a new image, so it can be drawn on directly
+                frames.append(draw_slot_layout(frame.convert("RGBA"), layout))
             out_buf = io.BytesIO()
             frames[0].save(out_buf, format="GIF", save_all=True, append_images=frames[1:], loop=0, duration=duration)
             out_buf.seek(0)
@@ -1,12 +1,37 @@
 import os
 import io
+import time
+import asyncio
+from collections import deque
 import httpx
 import discord
+from cachetools import LRUCache
 from discord import app_commands
 from discord.ext import commands
+from typing import Optional
 
 DISCORD_BOT_TOKEN = os.getenv("DISCORD_BOT_TOKEN")
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
+# global command sync is slow and rate-limited; set to 0 when the commands haven't changed
+SYNC_COMMANDS = os.getenv("SYNC_COMMANDS", "1") == "1"
+# slot generations in flight (or awaiting upload) at once; more only queue up behind
+# the backend's render pool
+GENERATE_CONCURRENCY = int(os.getenv("GENERATE_CONCURRENCY", 8))
+GENERATE_ATTEMPTS = 3  # 5xx / dropped connections are retried after 1s, then 2s
+# connects and pool waits fail fast; generate reads may sit out a cold render
+BACKEND_TIMEOUT = httpx.Timeout(20.0, connect=5.0, pool=10.0)
+GENERATE_TIMEOUT = httpx.Timeout(120.0, connect=5.0, pool=10.0)
+# per-message attachment limits (the backend batches its own sends the same way)
+DISCORD_MAX_FILES = 10
+DISCORD_MAX_UPLOAD_BYTES = int(os.getenv("DISCORD_MAX_UPLOAD_BYTES", 10 * 1024 * 1024))
+IMAGE_CACHE_BYTES = int(os.getenv("IMAGE_CACHE_BYTES", 32 * 1024 * 1024))
+CHANNEL_CACHE_TTL = 60  # seconds a guild's configured channel is reused without asking the backend
+
+# attachment file extension by image MIME type
+_EXT = {"image/gif": "gif", "image/png": "png", "image/jpeg": "jpg", "image/webp": "webp"}
+
+def _extension(content_type: str) -> str:
+    return _EXT.get(content_type.split(";", 1)[0].strip().lower(), "png")
 
 intents = discord.Intents.default()
 intents.message_content = True
@@ -16,32 +41,103 @@ bot = commands.Bot(command_prefix="-p ", intents=intents)
 class SlotCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # guild_id -> (channel_id, expires_at); the dashboard setting rarely changes
+        self._channel_cache: dict[str, tuple[str, float]] = {}
+        # (guild_id, slot) -> (etag, bytes, content_type) of recently sent images
+        self._images: LRUCache = LRUCache(maxsize=IMAGE_CACHE_BYTES, getsizeof=lambda v: len(v[1]))
+        # (guild_id, slot) -> pending backend request for it
+        self._inflight: dict[tuple[str, int], asyncio.Task] = {}
+
+    async def _configured_channel_id(self, guild_id: str) -> Optional[str]:
+        """Channel set for the guild in the dashboard, or None. Raises httpx.HTTPError if the lookup fails."""
+        cached = self._channel_cache.get(guild_id)
+        if cached and time.monotonic() < cached[1]:
+            return cached[0]
+        r = await self.bot.http_client.get(f"/api/guilds/{guild_id}/channel")
+        r.raise_for_status()
+        channel_id = r.json().get("channel_id")
+        if channel_id:
+            # unset channels are not cached, so a channel set just now is picked up
+            self._channel_cache[guild_id] = (channel_id, time.monotonic() + CHANNEL_CACHE_TTL)
+        return channel_id
+
+    async def _generate(self, guild_id: str, slot: int) -> Optional[tuple[bytes, str]]:
+        """
+        Rendered slot as (bytes, content_type), or None if the backend could not make it.
+        Concurrent calls for the same slot (e.g. two users sending it at once) share one
+        backend request.
+        """
+        key = (guild_id, slot)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_slot(guild_id, slot))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shielded: one caller giving up must not cancel the request for the others
+        return await asyncio.shield(task)
+
+    async def _fetch_slot(self, guild_id: str, slot: int) -> Optional[tuple[bytes, str]]:
+        """
+        Transient failures (5xx, network errors, timeouts) are retried with backoff and end in
+        None once the attempts run out. A slot fetched before is revalidated by ETag, so an
+        unchanged one is not rendered or downloaded again.
+        """
+        key = (guild_id, slot)
+        cached = self._images.get(key)
+        headers = {"If-None-Match": cached[0]} if cached else {}
+        for attempt in range(GENERATE_ATTEMPTS):
+            if attempt:
+                await asyncio.sleep(2 ** (attempt - 1))
+            try:
+                r = await self.bot.http_client.get(f"/api/generate/{guild_id}/{slot}", headers=headers, timeout=GENERATE_TIMEOUT)
+            except httpx.HTTPError:
+                # timeouts included; give up quietly so the caller can report the slot as failed
+                if attempt == GENERATE_ATTEMPTS - 1:
+                    return None
+                continue
+            if r.status_code < 500:
+                break
+        if r.status_code == 304 and cached:
+            return cached[1], cached[2]
+        if r.status_code != 200:
+            return None
+        content_type = r.headers.get("content-type","image/png")
+        # LRUCache raises ValueError for a single value larger than its maxsize
+        if "etag" in r.headers and len(r.content) <= IMAGE_CACHE_BYTES:
+            self._images[key] = (r.headers["etag"], r.content, content_type)
+        return r.content, content_type
 
     @app_commands.command(name="send_slot", description="Send a configured slot image to the configured channel")
     @app_commands.describe(guild_id="Guild ID to use (copy from dashboard)", slot="Slot number 2-25")
-    async def send_slot(self, interaction: discord.Interaction, guild_id: str, slot: int):
+    async def send_slot(self, interaction: discord.Interaction, guild_id: str, slot: app_commands.Range[int, 2, 25]):
         await interaction.response.defer(thinking=True)
-        async with httpx.AsyncClient() as client:
-            r = await client.get(f"{BACKEND_URL}/api/guilds/{guild_id}/channel")
-            if r.status_code != 200:
+        # the render is the slow part; it runs while the channel is being resolved
+        gen_task = asyncio.ensure_future(self._generate(guild_id, slot))
+        try:
+            try:
+                channel_id = await self._configured_channel_id(guild_id)
+            except httpx.HTTPError:
                 await interaction.followup.send("Could not fetch guild configuration.")
                 return
-            channel_id = r.json().get("channel_id")
             if not channel_id:
                 await interaction.followup.send("No channel configured for this guild in dashboard. Please set channel first.")
                 return
-            gen = await client.get(f"{BACKEND_URL}/api/generate/{guild_id}/{slot}", timeout=120)
-            if gen.status_code != 200:
-                await interaction.followup.send(f"Failed to generate slot {slot}.")
+            try:
+                # the gateway keeps guild channels cached; REST only on a miss
+                cid = int(channel_id)
+                channel = self.bot.get_channel(cid) or await self.bot.fetch_channel(cid)
+            except Exception as e:
+                self._channel_cache.pop(guild_id, None)  # stale or deleted channel: ask again next time
+                await interaction.followup.send(f"Failed to fetch channel: {e}")
                 return
-            content_type = gen.headers.get("content-type","image/png")
-            ext = "gif" if "gif" in content_type else "png"
-            data = gen.content
-        try:
-            channel = await self.bot.fetch_channel(int(channel_id))
-        except Exception as e:
-            await interaction.followup.send(f"Failed to fetch channel: {e}")
+            generated = await gen_task
+        finally:
+            gen_task.cancel()  # no-op once it has finished
+        if generated is None:
+            await interaction.followup.send(f"Failed to generate slot {slot}.")
             return
+        data, content_type = generated
+        ext = _extension(content_type)
         file = discord.File(io.BytesIO(data), filename=f"slot_{slot}.{ext}")
         await channel.send(file=file)
         await interaction.followup.send(f"Sent slot {slot} to <#{channel_id}>")
@@ -50,44 +146,108 @@ class SlotCog(commands.Cog):
     @app_commands.describe(guild_id="Guild ID to use (copy from dashboard)")
     async def send_all_slots(self, interaction: discord.Interaction, guild_id: str):
         await interaction.response.defer(thinking=True)
-        async with httpx.AsyncClient() as client:
-            r = await client.get(f"{BACKEND_URL}/api/guilds/{guild_id}/channel")
-            if r.status_code != 200:
-                await interaction.followup.send("Could not fetch guild configuration.")
-                return
-            channel_id = r.json().get("channel_id")
-            if not channel_id:
-                await interaction.followup.send("No channel configured.")
-                return
-            try:
-                channel = await self.bot.fetch_channel(int(channel_id))
-            except Exception as e:
-                await interaction.followup.send(f"Failed to fetch channel: {e}")
+        try:
+            channel_id = await self._configured_channel_id(guild_id)
+        except httpx.HTTPError:
+            await interaction.followup.send("Could not fetch guild configuration.")
+            return
+        if not channel_id:
+            await interaction.followup.send("No channel configured.")
+            return
+        try:
+            # the gateway keeps guild channels cached; REST only on a miss
+            cid = int(channel_id)
+            channel = self.bot.get_channel(cid) or await self.bot.fetch_channel(cid)
+        except Exception as e:
+            self._channel_cache.pop(guild_id, None)  # stale or deleted channel: ask again next time
+            await interaction.followup.send(f"Failed to fetch channel: {e}")
+            return
+        # Slots generate concurrently and are queued for sending in slot order as
+        # soon as they and every slot before them are ready, so uploads overlap
+        # later generations. The window holds at most GENERATE_CONCURRENCY slots
+        # that are generating or not yet queued, which bounds the image bodies
+        # held at once. Queued slots go out several per message.
+        slots = range(2, 26)
+        batch: list = []  # (filename, bytes) of the next message
+        batch_bytes = 0
+        sent = 0
+        failed: list[int] = []
+
+        async def flush():
+            nonlocal batch, batch_bytes, sent
+            if batch:
+                await channel.send(files=[discord.File(io.BytesIO(data), filename=fn) for fn, data in batch])
+                sent += len(batch)
+                batch, batch_bytes = [], 0
+                # progress on the deferred reply, once per message (a few edits per run)
+                try:
+                    await interaction.edit_original_response(content=f"Sent {sent}/{len(slots)} slots...")
+                except discord.HTTPException:
+                    pass
+
+        async def collect(s: int, task: asyncio.Task):
+            nonlocal batch_bytes
+            generated = await task
+            if generated is None:
+                failed.append(s)
                 return
-            for s in range(2, 26):
-                gen = await client.get(f"{BACKEND_URL}/api/generate/{guild_id}/{s}", timeout=120)
-                if gen.status_code != 200:
-                    continue
-                content_type = gen.headers.get("content-type","image/png")
-                ext = "gif" if "gif" in content_type else "png"
-                data = gen.content
-                file = discord.File(io.BytesIO(data), filename=f"slot_{s}.{ext}")
-                await channel.send(file=file)
-        await interaction.followup.send("Sent all slots.")
+            data, content_type = generated
+            ext = _extension(content_type)
+            if batch and (len(batch) >= DISCORD_MAX_FILES or batch_bytes + len(data) > DISCORD_MAX_UPLOAD_BYTES):
+                await flush()
+            batch.append((f"slot_{s}.{ext}", data))
+            batch_bytes += len(data)
+
+        window: deque = deque()
+        try:
+            for s in slots:
+                task = asyncio.ensure_future(self._generate(guild_id, s))
+                window.append((s, task))
+                if len(window) >= GENERATE_CONCURRENCY:
+                    await collect(*window.popleft())
+            while window:
+                await collect(*window.popleft())
+            await flush()
+        finally:
+            # a failed send leaves later generations running; don't leak them
+            for _, task in window:
+                task.cancel()
+        if failed:
+            await interaction.followup.send(
+                f"Sent {sent}/{len(slots)} slots. Failed to generate slots: {', '.join(map(str, failed))}."
+            )
+        else:
+            await interaction.followup.send("Sent all slots.")
 
 @bot.event
 async def on_ready():
+    # fires again on every gateway reconnect, so nothing expensive belongs here
     print(f"Bot logged in as {bot.user}")
-    await bot.tree.sync()
-    print("Slash commands synced.")
 
 async def main():
-    async with bot:
-        await bot.add_cog(SlotCog(bot))
-        await bot.start(DISCORD_BOT_TOKEN)
+    # one keep-alive client to the backend, shared by every command; over https
+    # (the deployed backend) concurrent generations multiplex on one HTTP/2 connection.
+    # Limits and http2 are set on the transport, which also retries failed connects.
+    async with httpx.AsyncClient(
+        base_url=BACKEND_URL,
+        timeout=BACKEND_TIMEOUT,
+        transport=httpx.AsyncHTTPTransport(
+            http2=True,
+            retries=2,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=32, keepalive_expiry=30),
+        ),
+    ) as http_client:
+        bot.http_client = http_client
+        async with bot:
+            await bot.add_cog(SlotCog(bot))
+            # bot.start() split in two so the command tree is synced once per process
+            await bot.login(DISCORD_BOT_TOKEN)
+            if SYNC_COMMANDS:
+                await bot.tree.sync()
+                print("Slash commands synced.")
+            await bot.connect()
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())
 
 import os